@@ -0,0 +1,12 @@
+import uvicorn
+
+# Entrada para desarrollo local: un solo worker con recarga automática
+if __name__ == "__main__":
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        workers=1,
+        log_level="info"
+    )
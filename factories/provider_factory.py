@@ -1,41 +1,54 @@
-from typing import Dict, Any
+from typing import Dict, Any, Type
 from models.providers import VMProvider, AWSProvider, AzureProvider, GCPProvider, OnPremiseProvider
 from models.schemas import ProviderType, ProviderInfo
 
 class VMProviderFactory:
     """Factory para crear instancias de proveedores de cloud"""
     
-    def __init__(self):
+    def __init__(self) -> None:
         self._providers = {
             ProviderType.AWS: AWSProvider,
             ProviderType.AZURE: AzureProvider,
             ProviderType.GCP: GCPProvider,
             ProviderType.ON_PREMISE: OnPremiseProvider,
         }
+        # Los proveedores no guardan estado entre solicitudes: se crea una
+        # única instancia por tipo y su ProviderInfo se calcula una sola vez
+        self._instances: Dict[ProviderType, VMProvider] = {}
+        self._info_cache: Dict[str, ProviderInfo] = {}
+        self._http_client: Any = None
+        for provider_type, provider_class in self._providers.items():
+            self._cache_provider(provider_type, provider_class)
+    
+    def _cache_provider(self, provider_type: ProviderType, provider_class: Type[VMProvider]) -> None:
+        """Instancia el proveedor y precalcula su información pública"""
+        provider_instance = provider_class()
+        provider_instance.http = self._http_client
+        self._instances[provider_type] = provider_instance
+        self._info_cache[provider_type.value] = ProviderInfo(
+            name=provider_instance.provider_name,
+            supported=True,
+            required_parameters=provider_instance.required_params
+        )
     
     def create_provider(self, provider_type: ProviderType) -> VMProvider:
-        """Crea una instancia del proveedor basado en el tipo"""
-        provider_class = self._providers.get(provider_type)
-        
-        if not provider_class:
+        """Retorna la instancia compartida del proveedor basado en el tipo"""
+        try:
+            return self._instances[provider_type]
+        except KeyError:
             raise ValueError(f"Proveedor no soportado: {provider_type}")
-        
-        return provider_class()
+    
+    def set_http_client(self, http_client: Any) -> None:
+        """Inyecta el cliente HTTP compartido en todos los proveedores"""
+        self._http_client = http_client
+        for provider_instance in self._instances.values():
+            provider_instance.http = http_client
     
     def get_available_providers(self) -> Dict[str, ProviderInfo]:
         """Retorna información de todos los proveedores disponibles"""
-        providers_info = {}
-        
-        for provider_type, provider_class in self._providers.items():
-            provider_instance = provider_class()
-            providers_info[provider_type.value] = ProviderInfo(
-                name=provider_instance.provider_name,
-                supported=True,
-                required_parameters=provider_instance.required_params
-            )
-        
-        return providers_info
+        return self._info_cache
     
-    def register_provider(self, provider_type: ProviderType, provider_class):
+    def register_provider(self, provider_type: ProviderType, provider_class: Type[VMProvider]) -> None:
         """Permite registrar nuevos proveedores dinámicamente"""
-        self._providers[provider_type] = provider_class
\ No newline at end of file
+        self._providers[provider_type] = provider_class
+        self._cache_provider(provider_type, provider_class)
@@ -1,10 +1,16 @@
-from fastapi import FastAPI, HTTPException, status, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, status, Query
+from fastapi.responses import ORJSONResponse, Response
+from collections import Counter
+from contextlib import asynccontextmanager
 from typing import Optional
 import logging
+import os
+import anyio
+import httpx
+import orjson
 import uvicorn
 
-from models.schemas import VMRequest, VMResponse, ProviderInfo, VMListResponse, ProviderVMsResponse, VMStatus
+from models.schemas import VMRequest, VMResponse, ProviderInfo, VMListResponse, ProviderVMsResponse, VMStatus, ProviderType
 from services.vm_service import VMProvisioningService
 
 # Configuración de logging
@@ -14,6 +20,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger("vm_provisioning_api")
 
+_VALID_PROVIDERS = frozenset(pt.value for pt in ProviderType)
+
+# Los endpoints son síncronos y se ejecutan en el threadpool de Starlette
+THREADPOOL_SIZE = 100
+
+def _warm_up(app: FastAPI):
+    """Paga en el arranque los costos que FastAPI difiere hasta la primera solicitud"""
+    # El esquema OpenAPI (y los JSON schema de cada modelo) se genera de forma perezosa
+    app.openapi()
+    
+    # Primer uso de los serializadores de respuesta y de la lectura del almacenamiento
+    for provider_info in vm_service.get_available_providers().values():
+        ProviderInfo.__pydantic_serializer__.to_json(provider_info)
+    vm_service.get_all_vms_json(limit=1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Configura recursos compartidos al iniciar la aplicación"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
+    # Cliente HTTP compartido para las llamadas salientes de los proveedores:
+    # reutiliza conexiones TCP/TLS en lugar de abrir una sesión por solicitud
+    app.state.http = httpx.Client(
+        limits=httpx.Limits(max_connections=THREADPOOL_SIZE, max_keepalive_connections=THREADPOOL_SIZE),
+        http2=True,
+        timeout=30
+    )
+    vm_service.set_http_client(app.state.http)
+    
+    _warm_up(app)
+    
+    yield
+    
+    vm_service.close()
+    app.state.http.close()
+
 # Crear aplicación FastAPI con tags organizados
 app = FastAPI(
     title="VM Provisioning Multi-Cloud API",
@@ -42,44 +84,58 @@ app = FastAPI(
     license_info={
         "name": "MIT",
         "url": "https://opensource.org/licenses/MIT",
-    }
+    },
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Inicializar servicio
 vm_service = VMProvisioningService()
 vm_service.set_logger(logger)
 
+@app.exception_handler(Exception)
+async def handle_unexpected_error(request: Request, exc: Exception):
+    """Respuesta única para errores no controlados en cualquier endpoint"""
+    logger.error("Error inesperado en %s %s: %s", request.method, request.url.path, exc)
+    return ORJSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Error interno del servidor"}
+    )
+
 # =============================================================================
 # ENDPOINTS DE INFORMACIÓN Y HEALTH CHECK
 # =============================================================================
 
+# Contenido estático: se serializa una sola vez al importar el módulo
+_ROOT_JSON = orjson.dumps({
+    "message": "VM Provisioning Multi-Cloud API",
+    "version": "1.0.0",
+    "description": "API unificada para aprovisionamiento de máquinas virtuales multi-cloud",
+    "endpoints": {
+        "provision": "POST /api/v1/vm/provision",
+        "providers": "GET /api/v1/providers",
+        "all_vms": "GET /api/v1/vms",
+        "vms_by_provider": "GET /api/v1/vms/provider/{provider_type}",
+        "vms_by_status": "GET /api/v1/vms/status/{status}",
+        "vm_by_id": "GET /api/v1/vms/{vm_id}",
+        "vms_summary": "GET /api/v1/vms-summary",
+        "health": "GET /health"
+    }
+})
+
 @app.get("/", tags=["Información"])
-async def root():
+def root():
     """Endpoint raíz con información general de la API"""
-    return {
-        "message": "VM Provisioning Multi-Cloud API",
-        "version": "1.0.0",
-        "description": "API unificada para aprovisionamiento de máquinas virtuales multi-cloud",
-        "endpoints": {
-            "provision": "POST /api/v1/vm/provision",
-            "providers": "GET /api/v1/providers",
-            "all_vms": "GET /api/v1/vms",
-            "vms_by_provider": "GET /api/v1/vms/provider/{provider_type}",
-            "vms_by_status": "GET /api/v1/vms/status/{status}",
-            "vm_by_id": "GET /api/v1/vms/{vm_id}",
-            "vms_summary": "GET /api/v1/vms-summary",
-            "health": "GET /health"
-        }
-    }
+    return Response(_ROOT_JSON, media_type="application/json")
 
 @app.get("/health", tags=["Health Check"])
-async def health_check():
+def health_check():
     """Health check del API - Verifica estado del servicio"""
-    return {
+    return ORJSONResponse({
         "status": "healthy", 
         "service": "vm_provisioning",
         "timestamp": vm_service._get_timestamp()
-    }
+    })
 
 # =============================================================================
 # ENDPOINTS DE PROVEEDORES
@@ -90,16 +146,8 @@ async def health_check():
          tags=["Proveedores"],
          summary="Obtener proveedores disponibles",
          description="Retorna la lista de todos los proveedores cloud soportados y sus parámetros requeridos")
-async def get_available_providers():
-    try:
-        providers = vm_service.get_available_providers()
-        return providers
-    except Exception as e:
-        logger.error(f"Error obteniendo proveedores: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
-        )
+def get_available_providers():
+    return vm_service.get_available_providers()
 
 # =============================================================================
 # ENDPOINTS DE APROVISIONAMIENTO
@@ -135,27 +183,19 @@ async def get_available_providers():
           - ram_gb (ej: 4)
           - storage_gb (ej: 50)
           """)
-async def provision_vm(vm_request: VMRequest):
-    try:
-        logger.info(f"Solicitud de aprovisionamiento recibida para {vm_request.provider_type}")
-        
-        # Procesar la solicitud
-        response = vm_service.provision_vm(vm_request)
-        
-        # Log del resultado
-        if response.status == "success":
-            logger.info(f"VM creada exitosamente: {response.vm_id}")
-        else:
-            logger.error(f"Error creando VM: {response.error_message}")
-        
-        return response
-        
-    except Exception as e:
-        logger.error(f"Error inesperado: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error interno del servidor: {str(e)}"
-        )
+def provision_vm(vm_request: VMRequest):
+    logger.info("Solicitud de aprovisionamiento recibida para %s", vm_request.provider_type.value)
+    
+    # Procesar la solicitud
+    response = vm_service.provision_vm(vm_request)
+    
+    # Log del resultado
+    if response.status == "success":
+        logger.info("VM creada exitosamente: %s", response.vm_id)
+    else:
+        logger.error("Error creando VM: %s", response.error_message)
+    
+    return response
 
 # =============================================================================
 # ENDPOINTS DE CONSULTA DE VMs
@@ -166,111 +206,64 @@ async def provision_vm(vm_request: VMRequest):
          tags=["Consultas de VMs"],
          summary="Obtener todas las VMs",
          description="Retorna todas las máquinas virtuales creadas, organizadas por tipo de proveedor con paginación")
-async def get_all_vms(
+def get_all_vms(
     limit: int = Query(100, ge=1, le=1000, description="Límite de resultados por página"),
     offset: int = Query(0, ge=0, description="Offset para paginación")
 ):
-    try:
-        response = vm_service.get_all_vms()
-        
-        # Aplicar paginación
-        if offset < len(response.vms):
-            response.vms = response.vms[offset:offset + limit]
-        else:
-            response.vms = []
-        
-        return response
-        
-    except Exception as e:
-        logger.error(f"Error obteniendo VMs: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
-        )
+    # Bytes ya serializados (cacheados en el servicio): se entregan sin pasar por response_model
+    return Response(vm_service.get_all_vms_json(limit=limit, offset=offset), media_type="application/json")
 
 @app.get("/api/v1/vms/provider/{provider_type}", 
          response_model=ProviderVMsResponse,
          tags=["Consultas de VMs"],
          summary="Obtener VMs por proveedor",
          description="Retorna máquinas virtuales filtradas por un proveedor cloud específico")
-async def get_vms_by_provider(
+def get_vms_by_provider(
     provider_type: str,
-    status: Optional[VMStatus] = Query(None, description="Filtrar por estado específico")
+    vm_status: Optional[VMStatus] = Query(None, alias="status", description="Filtrar por estado específico")
 ):
-    try:
-        # Validar que el proveedor existe
-        providers = vm_service.get_available_providers()
-        if provider_type not in providers:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Proveedor {provider_type} no encontrado. Proveedores disponibles: {list(providers.keys())}"
-            )
-        
-        response = vm_service.get_vms_by_provider(provider_type)
-        
-        # Filtrar por estado si se especifica
-        if status:
-            response.vms = [vm for vm in response.vms if vm.status == status]
-            response.total_vms = len(response.vms)
-        
-        return response
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error obteniendo VMs por proveedor: {str(e)}")
+    # Validar que el proveedor existe
+    if provider_type not in _VALID_PROVIDERS:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Proveedor {provider_type} no encontrado. Proveedores disponibles: {sorted(_VALID_PROVIDERS)}"
         )
+    
+    # El filtro por estado se resuelve en el repositorio
+    return Response(
+        vm_service.get_vms_by_provider_json(provider_type, status=vm_status),
+        media_type="application/json"
+    )
 
 @app.get("/api/v1/vms/status/{status}", 
          response_model=VMListResponse,
          tags=["Consultas de VMs"],
          summary="Obtener VMs por estado",
          description="Retorna máquinas virtuales filtradas por estado específico")
-async def get_vms_by_status(status: VMStatus):
-    try:
-        vms = vm_service.get_vms_by_status(status)
-        
-        # Calcular resumen por proveedor
-        vms_by_provider = {}
-        for vm in vms:
-            vms_by_provider[vm.provider_type] = vms_by_provider.get(vm.provider_type, 0) + 1
-        
-        return VMListResponse(
-            total_vms=len(vms),
-            vms_by_provider=vms_by_provider,
-            vms=vms
-        )
-        
-    except Exception as e:
-        logger.error(f"Error obteniendo VMs por estado: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
-        )
+def get_vms_by_status(status: VMStatus):
+    vms = vm_service.get_vms_by_status(status)
+    
+    # Calcular resumen por proveedor
+    vms_by_provider = dict(Counter(vm.provider_type for vm in vms))
+    
+    return VMListResponse(
+        total_vms=len(vms),
+        vms_by_provider=vms_by_provider,
+        vms=vms
+    )
 
 @app.get("/api/v1/vms/{vm_id}",
          tags=["Consultas de VMs"],
          summary="Obtener VM por ID",
          description="Retorna los detalles completos de una máquina virtual específica usando su ID único")
-async def get_vm_by_id(vm_id: str):
+def get_vm_by_id(vm_id: str):
     try:
-        vm = vm_service.get_vm_by_id(vm_id)
-        return vm
-        
+        return vm_service.get_vm_by_id(vm_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
-    except Exception as e:
-        logger.error(f"Error obteniendo VM por ID: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
-        )
 
 # =============================================================================
 # ENDPOINTS DE ESTADÍSTICAS Y MÉTRICAS
@@ -280,17 +273,8 @@ async def get_vm_by_id(vm_id: str):
          tags=["Estadísticas"],
          summary="Resumen de VMs",
          description="Retorna un resumen estadístico con métricas agregadas de todas las máquinas virtuales")
-async def get_vms_summary():
-    try:
-        summary = vm_service.get_vms_summary()
-        return summary
-        
-    except Exception as e:
-        logger.error(f"Error obteniendo resumen de VMs: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
-        )
+def get_vms_summary():
+    return vm_service.get_vms_summary()
 
 # =============================================================================
 # ENDPOINTS DE GESTIÓN DE ESTADOS
@@ -300,37 +284,36 @@ async def get_vms_summary():
          tags=["Gestión de Estados"],
          summary="Actualizar estado de VM",
          description="Actualiza el estado de una máquina virtual existente")
-async def update_vm_status(vm_id: str, new_status: VMStatus):
-    try:
-        success = vm_service.update_vm_status(vm_id, new_status)
-        
-        if success:
-            return {
-                "message": f"Estado de VM {vm_id} actualizado a {new_status}",
-                "vm_id": vm_id,
-                "new_status": new_status,
-                "timestamp": vm_service._get_timestamp()
-            }
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"VM con ID {vm_id} no encontrada"
-            )
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error actualizando estado de VM: {str(e)}")
+def update_vm_status(vm_id: str, new_status: VMStatus):
+    if not vm_service.update_vm_status(vm_id, new_status):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error interno del servidor"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"VM con ID {vm_id} no encontrada"
         )
+    
+    return {
+        "message": f"Estado de VM {vm_id} actualizado a {new_status.value}",
+        "vm_id": vm_id,
+        "new_status": new_status,
+        "timestamp": vm_service._get_timestamp()
+    }
+
+def _default_workers() -> int:
+    """Un worker por núcleo (máx. 4) cuando el estado se comparte en Redis"""
+    if not os.getenv("REDIS_URL"):
+        # SQLite local: un solo proceso evita contención por el bloqueo de escritura
+        return 1
+    return min(os.cpu_count() or 1, 4)
 
 if __name__ == "__main__":
+    # uvloop y httptools se piden explícitamente: si no están instalados
+    # uvicorn falla al arrancar en lugar de caer a asyncio/h11 sin avisar
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("UVICORN_WORKERS", _default_workers())),
         log_level="info"
     )
\ No newline at end of file
@@ -1,57 +1,42 @@
-
 ### **4. models/providers.py** - Clases de Proveedores
 
-from abc import ABC, abstractmethod
-from typing import Dict, Any
-import uuid
+from abc import ABC
+from typing import Dict, Any, FrozenSet, List, Optional
+from datetime import datetime
+from secrets import token_hex
+import re
+from mypy_extensions import mypyc_attr
 from .schemas import VMResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
+_SENSITIVE_RE = re.compile(r'password|credential|token|key|secret', re.IGNORECASE)
+
+# Con mypyc, permite registrar proveedores definidos en código no compilado
+@mypyc_attr(allow_interpreted_subclasses=True)
 class VMProvider(ABC):
     """Clase abstracta base para todos los proveedores de cloud"""
     
-    def __init__(self):
-        self.logger = logger
-    
-    @abstractmethod
-    def create_vm(self, parameters: Dict[str, Any]) -> VMResponse:
-        pass
-    
-    @abstractmethod
-    def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
-        pass
-    
-    def log_provisioning(self, request_id: str, message: str):
-        """Método protegido para logging seguro"""
-        safe_message = self._sanitize_sensitive_data(message)
-        self.logger.info(f"[{request_id}] {safe_message}")
+    # Atributos que define cada proveedor en su __init__
+    provider_name: str
+    required_params: List[str]
+    _required_set: FrozenSet[str]
     
-    def _sanitize_sensitive_data(self, data: str) -> str:
-        """Elimina información sensible para logs"""
-        sensitive_keys = ['password', 'credential', 'token', 'key', 'secret']
-        result = data
-        for key in sensitive_keys:
-            result = result.replace(key, '***')
-        return result
+    # Prefijo del ID de las VMs creadas por el proveedor
+    _id_prefix: str = "vm-"
     
-    def _generate_request_id(self) -> str:
-        return f"req_{uuid.uuid4().hex[:8]}"
-
-class AWSProvider(VMProvider):
-    """Proveedor específico para AWS EC2"""
-    
-    def __init__(self):
-        super().__init__()
-        self.provider_name = "AWS"
-        self.required_params = ["instance_type", "region", "vpc", "ami"]
+    def __init__(self) -> None:
+        self.logger = logger
+        # Cliente HTTP compartido (con pool de conexiones) que inyecta el factory
+        self.http: Optional[Any] = None
     
     def create_vm(self, parameters: Dict[str, Any]) -> VMResponse:
+        """Flujo común de creación: validar, generar ID y registrar el resultado"""
         request_id = self._generate_request_id()
         
         try:
-            self.log_provisioning(request_id, f"Iniciando creación de VM en {self.provider_name}")
+            self.log_provisioning(request_id, "Iniciando creación de VM en %s", self.provider_name)
             
             # Validar parámetros
             if not self.validate_parameters(parameters):
@@ -63,14 +48,10 @@ class AWSProvider(VMProvider):
                     timestamp=self._get_timestamp()
                 )
             
-            # Simular lógica específica de AWS
-            instance_type = parameters.get("instance_type", "t2.micro")
-            region = parameters.get("region", "us-east-1")
+            # Aquí iría la llamada real al SDK del proveedor usando self.http
+            vm_id = f"{self._id_prefix}{token_hex(4)}"
             
-            # Aquí iría la llamada real a boto3/EC2
-            vm_id = f"i-{uuid.uuid4().hex[:8]}"
-            
-            self.log_provisioning(request_id, f"VM {vm_id} creada exitosamente en {region}")
+            self.log_provisioning(request_id, "VM %s creada %s", vm_id, self._describe_params(parameters))
             
             return VMResponse(
                 request_id=request_id,
@@ -81,7 +62,7 @@ class AWSProvider(VMProvider):
             )
             
         except Exception as e:
-            self.log_provisioning(request_id, f"Error en {self.provider_name}: {str(e)}")
+            self.log_provisioning(request_id, "Error en %s: %s", self.provider_name, e)
             return VMResponse(
                 request_id=request_id,
                 status="error",
@@ -91,177 +72,95 @@ class AWSProvider(VMProvider):
             )
     
     def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
-        return all(param in parameters for param in self.required_params)
+        """Verifica que estén presentes todos los parámetros requeridos"""
+        return self._required_set <= parameters.keys()
+    
+    def _describe_params(self, parameters: Dict[str, Any]) -> str:
+        """Detalle específico del proveedor para el log de creación"""
+        return "exitosamente"
+    
+    def log_provisioning(self, request_id: str, message: str, *args: Any) -> None:
+        """Método protegido para logging seguro
+        
+        El mensaje se formatea con ``%`` y se sanitiza solo si el nivel INFO
+        está habilitado, igual que el formateo diferido de ``logging``.
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        safe_message = self._sanitize_sensitive_data(message % args if args else message)
+        self.logger.info("[%s] %s", request_id, safe_message)
+    
+    def _sanitize_sensitive_data(self, data: str) -> str:
+        """Elimina información sensible para logs"""
+        return _SENSITIVE_RE.sub('***', data)
+    
+    def _generate_request_id(self) -> str:
+        return f"req_{token_hex(4)}"
+    
+    def _get_timestamp(self) -> str:
+        return datetime.now().isoformat(timespec='seconds')
+
+class AWSProvider(VMProvider):
+    """Proveedor específico para AWS EC2"""
+    
+    _id_prefix = "i-"
+    
+    def __init__(self) -> None:
+        super().__init__()
+        self.provider_name = "AWS"
+        self.required_params = ["instance_type", "region", "vpc", "ami"]
+        self._required_set = frozenset(self.required_params)
     
-    def _get_timestamp(self):
-        from datetime import datetime
-        return datetime.now().isoformat()
+    def _describe_params(self, parameters: Dict[str, Any]) -> str:
+        region = parameters.get("region", "us-east-1")
+        return f"exitosamente en {region}"
 
 class AzureProvider(VMProvider):
     """Proveedor específico para Azure Virtual Machines"""
     
-    def __init__(self):
+    _id_prefix = "az-vm-"
+    
+    def __init__(self) -> None:
         super().__init__()
         self.provider_name = "Azure"
         self.required_params = ["vm_size", "resource_group", "location"]
+        self._required_set = frozenset(self.required_params)
     
-    def create_vm(self, parameters: Dict[str, Any]) -> VMResponse:
-        request_id = self._generate_request_id()
-        
-        try:
-            self.log_provisioning(request_id, f"Iniciando creación de VM en {self.provider_name}")
-            
-            if not self.validate_parameters(parameters):
-                return VMResponse(
-                    request_id=request_id,
-                    status="error",
-                    error_message=f"Parámetros inválidos para {self.provider_name}",
-                    provider_type=self.provider_name,
-                    timestamp=self._get_timestamp()
-                )
-            
-            # Simular lógica específica de Azure
-            vm_size = parameters.get("vm_size", "Standard_B1s")
-            resource_group = parameters.get("resource_group", "default-rg")
-            
-            vm_id = f"az-vm-{uuid.uuid4().hex[:8]}"
-            
-            self.log_provisioning(request_id, f"VM {vm_id} creada en resource group {resource_group}")
-            
-            return VMResponse(
-                request_id=request_id,
-                status="success",
-                vm_id=vm_id,
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-            
-        except Exception as e:
-            return VMResponse(
-                request_id=request_id,
-                status="error",
-                error_message=str(e),
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-    
-    def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
-        return all(param in parameters for param in self.required_params)
-    
-    def _get_timestamp(self):
-        from datetime import datetime
-        return datetime.now().isoformat()
+    def _describe_params(self, parameters: Dict[str, Any]) -> str:
+        resource_group = parameters.get("resource_group", "default-rg")
+        return f"en resource group {resource_group}"
 
 class GCPProvider(VMProvider):
     """Proveedor específico para Google Cloud Compute Engine"""
     
-    def __init__(self):
+    _id_prefix = "gcp-vm-"
+    
+    def __init__(self) -> None:
         super().__init__()
         self.provider_name = "GCP"
         self.required_params = ["machine_type", "zone", "project_id"]
+        self._required_set = frozenset(self.required_params)
     
-    def create_vm(self, parameters: Dict[str, Any]) -> VMResponse:
-        request_id = self._generate_request_id()
-        
-        try:
-            self.log_provisioning(request_id, f"Iniciando creación de VM en {self.provider_name}")
-            
-            if not self.validate_parameters(parameters):
-                return VMResponse(
-                    request_id=request_id,
-                    status="error",
-                    error_message=f"Parámetros inválidos para {self.provider_name}",
-                    provider_type=self.provider_name,
-                    timestamp=self._get_timestamp()
-                )
-            
-            # Simular lógica específica de GCP
-            machine_type = parameters.get("machine_type", "n1-standard-1")
-            zone = parameters.get("zone", "us-central1-a")
-            
-            vm_id = f"gcp-vm-{uuid.uuid4().hex[:8]}"
-            
-            self.log_provisioning(request_id, f"VM {vm_id} creada en zona {zone}")
-            
-            return VMResponse(
-                request_id=request_id,
-                status="success",
-                vm_id=vm_id,
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-            
-        except Exception as e:
-            return VMResponse(
-                request_id=request_id,
-                status="error",
-                error_message=str(e),
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-    
-    def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
-        return all(param in parameters for param in self.required_params)
-    
-    def _get_timestamp(self):
-        from datetime import datetime
-        return datetime.now().isoformat()
+    def _describe_params(self, parameters: Dict[str, Any]) -> str:
+        zone = parameters.get("zone", "us-central1-a")
+        return f"en zona {zone}"
 
 class OnPremiseProvider(VMProvider):
 
     """Proveedor para infraestructura on-premise"""
     
-    def __init__(self):
+    _id_prefix = "onprem-vm-"
+    
+    def __init__(self) -> None:
         super().__init__()
         self.provider_name = "OnPremise"
         self.required_params = ["cpu_cores", "ram_gb", "storage_gb"]
+        self._required_set = frozenset(self.required_params)
     
-    def create_vm(self, parameters: Dict[str, Any]) -> VMResponse:
-        request_id = self._generate_request_id()
-        
-        try:
-            self.log_provisioning(request_id, f"Iniciando creación de VM en {self.provider_name}")
-            
-            if not self.validate_parameters(parameters):
-                return VMResponse(
-                    request_id=request_id,
-                    status="error",
-                    error_message=f"Parámetros inválidos para {self.provider_name}",
-                    provider_type=self.provider_name,
-                    timestamp=self._get_timestamp()
-                )
-            
-            # Simular lógica específica on-premise
-            cpu_cores = parameters.get("cpu_cores", 2)
-            ram_gb = parameters.get("ram_gb", 4)
-            
-            vm_id = f"onprem-vm-{uuid.uuid4().hex[:8]}"
-            
-            self.log_provisioning(request_id, f"VM {vm_id} creada con {cpu_cores} CPUs y {ram_gb}GB RAM")
-            
-            return VMResponse(
-                request_id=request_id,
-                status="success",
-                vm_id=vm_id,
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-            
-        except Exception as e:
-            return VMResponse(
-                request_id=request_id,
-                status="error",
-                error_message=str(e),
-                provider_type=self.provider_name,
-                timestamp=self._get_timestamp()
-            )
-    
-    def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
-        return all(param in parameters for param in self.required_params)
-    
-    def _get_timestamp(self):
-        from datetime import datetime
-        return datetime.now().isoformat()
+    def _describe_params(self, parameters: Dict[str, Any]) -> str:
+        cpu_cores = parameters.get("cpu_cores", 2)
+        ram_gb = parameters.get("ram_gb", 4)
+        return f"con {cpu_cores} CPUs y {ram_gb}GB RAM"
 
 # class OracleCloudProvider(VMProvider):
     """Proveedor específico para Oracle Cloud Infrastructure (OCI)"""
@@ -305,7 +204,7 @@ class OnPremiseProvider(VMProvider):
             
     #         # Simular llamada a API de OCI
     #         # En un caso real, aquí usarías el SDK de Oracle
-    #         vm_id = f"ocid1.instance.oc1..{uuid.uuid4().hex[:32]}"
+    #         vm_id = f"ocid1.instance.oc1..{token_hex(16)}"
             
     #         # Configuraciones específicas de Oracle
     #         self._configure_boot_volume(parameters)
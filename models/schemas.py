@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Dict, Any, Optional,List
 from enum import Enum
 from datetime import datetime
+import orjson
 
 class ProviderType(str, Enum):
     AWS = "aws"
@@ -13,8 +14,20 @@ class ProviderType(str, Enum):
 class VMRequest(BaseModel):
     provider_type: ProviderType = Field(..., description="Tipo de proveedor cloud")
     parameters: Dict[str, Any] = Field(..., description="Parámetros específicos del proveedor")
+    
+    @field_validator("parameters")
+    @classmethod
+    def check_parameters_storable(cls, value: Dict[str, Any]) -> Dict[str, Any]:
+        """Rechaza valores que orjson no puede guardar (enteros de más de 64 bits)"""
+        try:
+            orjson.dumps(value)
+        except orjson.JSONEncodeError as e:
+            raise ValueError(f"Parámetros no serializables: {e}")
+        return value
 
 class VMResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+    
     request_id: str = Field(..., description="ID único de la solicitud")
     status: str = Field(..., description="success o error")
     vm_id: Optional[str] = Field(None, description="ID de la VM creada")
@@ -23,6 +36,8 @@ class VMResponse(BaseModel):
     timestamp: str = Field(..., description="Timestamp de la respuesta")
 
 class ProviderInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+    
     name: str
     supported: bool = True
     required_parameters: list[str] = []
@@ -34,6 +49,8 @@ class VMStatus(str, Enum):
     TERMINATED = "terminated"
 
 class VMDetails(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+    
     vm_id: str = Field(..., description="ID único de la VM")
     provider_type: str = Field(..., description="Tipo de proveedor")
     status: VMStatus = Field(..., description="Estado actual de la VM")
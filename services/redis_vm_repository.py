@@ -0,0 +1,210 @@
+from typing import Dict, List, Optional
+from models.schemas import VMDetails, VMStatus, ProviderType
+import orjson
+
+import redis
+
+class RedisVMRepository:
+    """Repositorio de VMs respaldado por Redis, compartido entre workers/pods
+    
+    Cada VM se guarda como un hash ``vm:{vm_id}``; los sets
+    ``vms:provider:{provider}`` y ``vms:status:{status}`` actúan como índices
+    secundarios y el sorted set ``vms:created`` mantiene el orden de creación
+    para paginar (el puntaje sale de un INCR, así dos VMs del mismo segundo
+    no empatan).
+    """
+    
+    CREATED_KEY = "vms:created"
+    # Secuencia de altas: puntaje de vms:created, creciente entre workers/pods
+    SEQUENCE_KEY = "vms:seq"
+    # Contador que se incrementa en cada escritura
+    VERSION_KEY = "vms:version"
+    
+    def __init__(self, redis_url: str):
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+    
+    @staticmethod
+    def _vm_key(vm_id: str) -> str:
+        return f"vm:{vm_id}"
+    
+    @staticmethod
+    def _provider_key(provider_type: str) -> str:
+        return f"vms:provider:{provider_type.lower()}"
+    
+    @staticmethod
+    def _status_key(status: str) -> str:
+        return f"vms:status:{status}"
+    
+    @staticmethod
+    def _to_hash(vm_details: VMDetails) -> Dict[str, str]:
+        """Serializa una VM a los campos del hash (Redis no admite None)"""
+        return {
+            "vm_id": vm_details.vm_id,
+            "provider_type": vm_details.provider_type,
+            "status": VMStatus(vm_details.status).value,
+            "instance_type": vm_details.instance_type or "",
+            "region": vm_details.region or "",
+            "created_at": vm_details.created_at,
+            "parameters": orjson.dumps(vm_details.parameters).decode()
+        }
+    
+    @staticmethod
+    def _from_hash(data: Dict[str, str]) -> VMDetails:
+        # Los registros se validaron al guardarse: se construyen sin revalidar
+        return VMDetails.model_construct(
+            vm_id=data["vm_id"],
+            provider_type=data["provider_type"],
+            status=VMStatus(data["status"]),
+            instance_type=data["instance_type"] or None,
+            region=data["region"] or None,
+            created_at=data["created_at"],
+            parameters=orjson.loads(data["parameters"])
+        )
+    
+    def _fetch_vms(self, vm_ids: List[str]) -> List[VMDetails]:
+        """Obtiene varias VMs en un único round-trip con un pipeline"""
+        pipe = self.client.pipeline(transaction=False)
+        for vm_id in vm_ids:
+            pipe.hgetall(self._vm_key(vm_id))
+        return [self._from_hash(data) for data in pipe.execute() if data]
+    
+    def _fetch_sorted(self, vm_ids) -> List[VMDetails]:
+        """Obtiene VMs de la más reciente a la más antigua según vms:created"""
+        pipe = self.client.pipeline(transaction=False)
+        for vm_id in vm_ids:
+            pipe.hgetall(self._vm_key(vm_id))
+            pipe.zscore(self.CREATED_KEY, vm_id)
+        results = pipe.execute()
+        
+        scored = [
+            (score or 0, self._from_hash(data))
+            for data, score in zip(results[::2], results[1::2])
+            if data
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [vm for _, vm in scored]
+    
+    def save_vm(self, vm_details: VMDetails):
+        """Guarda los detalles de una VM creada y actualiza los índices"""
+        try:
+            record = self._to_hash(vm_details)
+            created_score = self.client.incr(self.SEQUENCE_KEY)
+            
+            pipe = self.client.pipeline()
+            pipe.hset(self._vm_key(vm_details.vm_id), mapping=record)
+            pipe.sadd(self._provider_key(record["provider_type"]), vm_details.vm_id)
+            pipe.sadd(self._status_key(record["status"]), vm_details.vm_id)
+            pipe.zadd(self.CREATED_KEY, {vm_details.vm_id: created_score})
+            pipe.incr(self.VERSION_KEY)
+            pipe.execute()
+        
+        except Exception as e:
+            print(f"Error guardando VM: {e}")
+    
+    def data_version(self) -> Optional[str]:
+        """Valor que cambia con cada escritura; permite cachear respuestas"""
+        return self.client.get(self.VERSION_KEY)
+    
+    def get_all_vms(self, limit: Optional[int] = None, offset: int = 0) -> List[VMDetails]:
+        """Obtiene las VMs almacenadas, opcionalmente paginadas"""
+        try:
+            end = -1 if limit is None else offset + limit - 1
+            vm_ids = self.client.zrevrange(self.CREATED_KEY, offset, end)
+            return self._fetch_vms(vm_ids)
+        
+        except Exception as e:
+            print(f"Error leyendo VMs: {e}")
+            return []
+    
+    def count_vms_by_provider(self) -> Dict[str, int]:
+        """Cuenta las VMs por proveedor con SCARD sobre los índices"""
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for provider_type in ProviderType:
+                pipe.scard(self._provider_key(provider_type.value))
+            counts = pipe.execute()
+            
+            return {
+                provider_type.value: count
+                for provider_type, count in zip(ProviderType, counts)
+                if count
+            }
+        
+        except Exception as e:
+            print(f"Error contando VMs: {e}")
+            return {}
+    
+    def get_vms_by_provider(self, provider_type: str, status: Optional[VMStatus] = None) -> List[VMDetails]:
+        """Obtiene VMs filtradas por proveedor y, opcionalmente, por estado"""
+        try:
+            provider_key = self._provider_key(provider_type)
+            if status is None:
+                vm_ids = self.client.smembers(provider_key)
+            else:
+                # Intersección de índices en Redis: solo se leen las VMs que coinciden
+                vm_ids = self.client.sinter(provider_key, self._status_key(VMStatus(status).value))
+            return self._fetch_sorted(vm_ids)
+        except Exception as e:
+            print(f"Error leyendo VMs: {e}")
+            return []
+    
+    def get_vms_by_status(self, status: VMStatus) -> List[VMDetails]:
+        """Obtiene VMs filtradas por estado"""
+        try:
+            return self._fetch_sorted(self.client.smembers(self._status_key(VMStatus(status).value)))
+        except Exception as e:
+            print(f"Error leyendo VMs: {e}")
+            return []
+    
+    def get_vm_by_id(self, vm_id: str) -> Optional[VMDetails]:
+        """Obtiene una VM específica por ID"""
+        data = self.client.hgetall(self._vm_key(vm_id))
+        return self._from_hash(data) if data else None
+    
+    def get_vms_summary(self) -> Dict:
+        """Obtiene un resumen de todas las VMs a partir de los índices"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(self.CREATED_KEY)
+        for status in VMStatus:
+            pipe.scard(self._status_key(status.value))
+        total, *status_counts = pipe.execute()
+        
+        return {
+            "total_vms": total,
+            "vms_by_provider": self.count_vms_by_provider(),
+            "vms_by_status": {
+                status.value: count
+                for status, count in zip(VMStatus, status_counts)
+                if count
+            },
+            "recent_vms": self.get_all_vms(limit=10)  # Últimas 10 VMs
+        }
+    
+    def update_vm_status(self, vm_id: str, new_status: VMStatus) -> bool:
+        """Actualiza el estado de una VM moviéndola entre los índices de estado"""
+        vm_key = self._vm_key(vm_id)
+        new_value = VMStatus(new_status).value
+        
+        def _move_status(pipe) -> bool:
+            old_value = pipe.hget(vm_key, "status")
+            if old_value is None:
+                return False
+            
+            pipe.multi()
+            pipe.hset(vm_key, "status", new_value)
+            pipe.srem(self._status_key(old_value), vm_id)
+            pipe.sadd(self._status_key(new_value), vm_id)
+            pipe.incr(self.VERSION_KEY)
+            return True
+        
+        try:
+            # WATCH sobre el hash: si otro worker lo cambia, la transacción se reintenta
+            return self.client.transaction(_move_status, vm_key, value_from_callable=True)
+        
+        except Exception as e:
+            print(f"Error actualizando VM: {e}")
+            return False
+    
+    def close(self):
+        """Libera las conexiones del pool de Redis"""
+        self.client.close()
@@ -1,118 +1,494 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from models.schemas import VMDetails, VMStatus, ProviderType
-import json
+import msgspec
+import orjson
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime
 
+class VMDetailsRec(msgspec.Struct):
+    """Registro de VM tal como se guardaba en vm_storage.json (validado en C)"""
+    vm_id: str
+    provider_type: str
+    status: VMStatus
+    created_at: str
+    instance_type: Optional[str] = None
+    region: Optional[str] = None
+    parameters: Dict[str, Any] = {}
+
+class _LegacyStorage(msgspec.Struct):
+    vms: Dict[str, VMDetailsRec] = {}
+
 class VMRepository:
-    """Repositorio para almacenar y consultar información de VMs creadas"""
+    """Repositorio para almacenar y consultar información de VMs creadas
     
-    def __init__(self, storage_file: str = "vm_storage.json"):
-        self.storage_file = storage_file
-        self._ensure_storage_file()
+    Las VMs se guardan en SQLite en modo WAL: cada alta o cambio de estado
+    se agrega al final del WAL (las altas, por lotes en una transacción) y
+    los filtros usan índices. El WAL se limita a 10MB tras cada checkpoint.
     
-    def _ensure_storage_file(self):
-        """Asegura que el archivo de almacenamiento exista"""
-        if not os.path.exists(self.storage_file):
-            with open(self.storage_file, 'w') as f:
-                json.dump({"vms": {}}, f)
+    Las altas pendientes se escriben como mucho FLUSH_INTERVAL segundos después
+    de llegar: hasta entonces solo existen en este proceso, otros workers no las
+    ven y se pierden si el proceso muere sin pasar por close().
+    """
     
-    def save_vm(self, vm_details: VMDetails):
-        """Guarda los detalles de una VM creada"""
-        try:
-            with open(self.storage_file, 'r') as f:
-                data = json.load(f)
+    # Archivo del formato anterior; se importa una vez si la base está vacía
+    LEGACY_JSON_FILE = "vm_storage.json"
+    
+    # Las altas se acumulan y se escriben en una transacción cada N VMs o T segundos
+    FLUSH_BATCH_SIZE = 64
+    FLUSH_INTERVAL = 1.0
+    
+    # Segundos que una escritura espera si otro proceso tiene la base bloqueada
+    BUSY_TIMEOUT = 10.0
+    
+    _COLUMNS = "vm_id, provider_type, status, instance_type, region, created_at, parameters"
+    
+    def __init__(self, storage_file: str = "vm_storage.db"):
+        self.storage_file = storage_file
+        # timeout: espera al bloqueo de escritura de otros procesos en lugar de fallar
+        self._conn = sqlite3.connect(
+            storage_file,
+            isolation_level=None,
+            check_same_thread=False,
+            timeout=self.BUSY_TIMEOUT
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._ensure_schema()
+        
+        # Caché de las VMs ya construidas, ordenadas por fecha de creación
+        self._cache: Optional[List[VMDetails]] = None
+        self._cache_version: Optional[tuple] = None
+        self._by_id: Dict[str, VMDetails] = {}
+        self._by_provider: Dict[str, List[VMDetails]] = {}
+        self._by_status: Dict[str, List[VMDetails]] = {}
+        # PRAGMA data_version solo cambia con commits de otras conexiones
+        self._writes = 0
+        
+        # Buffer de escritura diferida para ráfagas de aprovisionamiento
+        self._pending: List[Tuple[VMDetails, tuple]] = []
+        self._pending_since = 0.0
+        self._flush_timer: Optional[threading.Timer] = None
+        
+        # La conexión y la caché se comparten entre los hilos del threadpool:
+        # todo acceso pasa por este lock (reentrante: las lecturas vuelcan el buffer)
+        self._lock = threading.RLock()
+    
+    def _ensure_schema(self):
+        """Configura la conexión y crea la tabla e índices si no existen"""
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-20000;
+            PRAGMA mmap_size=268435456;
+            PRAGMA journal_size_limit=10485760;
+            -- INSERT OR REPLACE dispara el trigger de borrado sobre la fila reemplazada
+            PRAGMA recursive_triggers=ON;
             
-            # Agregar la nueva VM
-            if "vms" not in data:
-                data["vms"] = {}
+            CREATE TABLE IF NOT EXISTS vms (
+                vm_id TEXT PRIMARY KEY,
+                provider_type TEXT NOT NULL COLLATE NOCASE,
+                status TEXT NOT NULL,
+                instance_type TEXT,
+                region TEXT,
+                created_at TEXT NOT NULL,
+                parameters TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_provider ON vms(provider_type);
+            CREATE INDEX IF NOT EXISTS idx_status ON vms(status);
+            CREATE INDEX IF NOT EXISTS idx_created_at ON vms(created_at);
             
-            data["vms"][vm_details.vm_id] = {
-                "vm_id": vm_details.vm_id,
-                "provider_type": vm_details.provider_type,
-                "status": vm_details.status,
-                "instance_type": vm_details.instance_type,
-                "region": vm_details.region,
-                "created_at": vm_details.created_at,
-                "parameters": vm_details.parameters
-            }
+            -- Conteos por proveedor y estado, mantenidos por triggers en cada escritura
+            CREATE TABLE IF NOT EXISTS vm_counts (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (kind, key)
+            ) WITHOUT ROWID;
             
-            with open(self.storage_file, 'w') as f:
-                json.dump(data, f, indent=2)
-                
-        except Exception as e:
-            print(f"Error guardando VM: {e}")
+            CREATE TRIGGER IF NOT EXISTS vms_counts_insert AFTER INSERT ON vms BEGIN
+                INSERT INTO vm_counts VALUES ('provider', NEW.provider_type, 1)
+                    ON CONFLICT(kind, key) DO UPDATE SET n = n + 1;
+                INSERT INTO vm_counts VALUES ('status', NEW.status, 1)
+                    ON CONFLICT(kind, key) DO UPDATE SET n = n + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS vms_counts_delete AFTER DELETE ON vms BEGIN
+                UPDATE vm_counts SET n = n - 1 WHERE kind = 'provider' AND key = OLD.provider_type;
+                UPDATE vm_counts SET n = n - 1 WHERE kind = 'status' AND key = OLD.status;
+            END;
+            CREATE TRIGGER IF NOT EXISTS vms_counts_update AFTER UPDATE OF status ON vms
+            WHEN OLD.status <> NEW.status BEGIN
+                UPDATE vm_counts SET n = n - 1 WHERE kind = 'status' AND key = OLD.status;
+                INSERT INTO vm_counts VALUES ('status', NEW.status, 1)
+                    ON CONFLICT(kind, key) DO UPDATE SET n = n + 1;
+            END;
+        """)
+        self._backfill_counts()
+        self._import_legacy_json()
+    
+    def _backfill_counts(self):
+        """Calcula los conteos de una base creada antes de existir vm_counts"""
+        if self._conn.execute("SELECT 1 FROM vm_counts LIMIT 1").fetchone():
+            return
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO vm_counts SELECT 'provider', provider_type, COUNT(*) FROM vms GROUP BY provider_type"
+            )
+            self._conn.execute(
+                "INSERT INTO vm_counts SELECT 'status', status, COUNT(*) FROM vms GROUP BY status"
+            )
     
-    def get_all_vms(self) -> List[VMDetails]:
-        """Obtiene todas las VMs almacenadas"""
+    def _import_legacy_json(self):
+        """Migra las VMs de vm_storage.json la primera vez que se crea la base"""
+        if not os.path.exists(self.LEGACY_JSON_FILE):
+            return
+        if self._conn.execute("SELECT 1 FROM vms LIMIT 1").fetchone():
+            return
+        
         try:
-            with open(self.storage_file, 'r') as f:
-                data = json.load(f)
+            with open(self.LEGACY_JSON_FILE, 'rb') as f:
+                data = msgspec.json.decode(f.read(), type=_LegacyStorage)
             
-            vms = []
-            for vm_id, vm_data in data.get("vms", {}).items():
-                vms.append(VMDetails(**vm_data))
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for record in data.vms.values():
+                    self._insert(self._to_row(record))
+        
+        except Exception as e:
+            print(f"Error importando {self.LEGACY_JSON_FILE}: {e}")
+    
+    @staticmethod
+    def _to_row(vm_details: Any) -> tuple:
+        """Convierte un VMDetails o un VMDetailsRec (mismos atributos) en una fila"""
+        return (
+            vm_details.vm_id,
+            vm_details.provider_type,
+            VMStatus(vm_details.status).value,
+            vm_details.instance_type,
+            vm_details.region,
+            vm_details.created_at,
+            orjson.dumps(vm_details.parameters).decode()
+        )
+    
+    def _insert(self, row: tuple):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO vms ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            row
+        )
+    
+    @staticmethod
+    def _row_to_vm(row: sqlite3.Row) -> VMDetails:
+        # Los registros se validaron al guardarse: se construyen sin revalidar
+        return VMDetails.model_construct(
+            vm_id=row["vm_id"],
+            provider_type=row["provider_type"],
+            status=VMStatus(row["status"]),
+            instance_type=row["instance_type"],
+            region=row["region"],
+            created_at=row["created_at"],
+            parameters=orjson.loads(row["parameters"])
+        )
+    
+    def _query_vms(self, where: str = "", params: tuple = (), limit: Optional[int] = None, offset: int = 0) -> List[VMDetails]:
+        """Consulta VMs ordenadas de la más reciente a la más antigua"""
+        rows = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM vms {where} "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?",
+            (*params, -1 if limit is None else limit, offset)
+        )
+        return [self._row_to_vm(row) for row in rows]
+    
+    def _counts(self, kind: str) -> Dict[str, int]:
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute("SELECT key, n FROM vm_counts WHERE kind = ? AND n > 0", (kind,))
+            return {key: n for key, n in rows}
+    
+    def _data_version(self) -> tuple:
+        """Versión de los datos: commits de otras conexiones y escrituras propias"""
+        (version,) = self._conn.execute("PRAGMA data_version").fetchone()
+        return version, self._writes
+    
+    def data_version(self) -> tuple:
+        """Valor que cambia con cada escritura; permite cachear respuestas"""
+        with self._lock:
+            self.flush()
+            return self._data_version()
+    
+    def _cache_current(self) -> bool:
+        return self._cache is not None and self._cache_version == self._data_version()
+    
+    def _begin_write(self) -> Tuple[int, bool]:
+        """Abre una transacción de escritura y comprueba si la caché sigue al día
+        
+        Con BEGIN IMMEDIATE ya tomado ninguna otra conexión puede confirmar
+        cambios hasta el COMMIT: la versión leída aquí es la que tendrá la base
+        después de la escritura propia (data_version ignora los commits propios).
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        (db_version,) = self._conn.execute("PRAGMA data_version").fetchone()
+        cache_current = self._cache is not None and self._cache_version == (db_version, self._writes)
+        return db_version, cache_current
+    
+    def _load(self) -> List[VMDetails]:
+        """Retorna las VMs en caché, recargándolas solo si la base cambió"""
+        self.flush()
+        version = self._data_version()
+        if version == self._cache_version and self._cache is not None:
+            return self._cache
+        
+        vms = self._query_vms()
+        
+        # Índices en memoria; conservan el orden por fecha de creación
+        by_provider: Dict[str, List[VMDetails]] = {}
+        by_status: Dict[str, List[VMDetails]] = {}
+        for vm in vms:
+            by_provider.setdefault(vm.provider_type.lower(), []).append(vm)
+            by_status.setdefault(vm.status, []).append(vm)
+        
+        self._by_id = {vm.vm_id: vm for vm in vms}
+        self._by_provider = by_provider
+        self._by_status = by_status
+        self._cache = vms
+        self._cache_version = version
+        return vms
+    
+    def save_vm(self, vm_details: VMDetails):
+        """Guarda los detalles de una VM creada en el próximo volcado por lotes
+        
+        La fila se codifica aquí: un error de serialización llega a la
+        solicitud que lo causó en lugar de perderse en el volcado.
+        """
+        row = self._to_row(vm_details)
+        
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+                self._start_flush_timer()
+            self._pending.append((vm_details, row))
+            due = (
+                len(self._pending) >= self.FLUSH_BATCH_SIZE
+                or time.monotonic() - self._pending_since >= self.FLUSH_INTERVAL
+            )
+        
+        if due:
+            self.flush()
+    
+    def _start_flush_timer(self):
+        """Programa un volcado para que una VM aislada no espere a la próxima alta"""
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.FLUSH_INTERVAL, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+    
+    def flush(self):
+        """Escribe las VMs pendientes en una sola transacción
+        
+        Cada fila va en su propio SAVEPOINT: una fila que falla se descarta
+        sola. Si falla la transacción completa las VMs vuelven al buffer.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
             
-            return sorted(vms, key=lambda x: x.created_at, reverse=True)
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
             
+            try:
+                written: List[VMDetails] = []
+                with self._conn:
+                    db_version, cache_current = self._begin_write()
+                    for vm_details, row in pending:
+                        self._conn.execute("SAVEPOINT vm_row")
+                        try:
+                            self._insert(row)
+                        except (sqlite3.IntegrityError, sqlite3.InterfaceError) as e:
+                            # Error propio de la fila; bloqueos o E/S abortan el lote entero
+                            self._conn.execute("ROLLBACK TO vm_row")
+                            print(f"Error guardando VM {vm_details.vm_id}: {e}")
+                        else:
+                            written.append(vm_details)
+                        self._conn.execute("RELEASE vm_row")
+                self._writes += 1
+                
+                # Si la caché estaba al día se actualiza en lugar de recargarla
+                if cache_current and self._add_to_cache(written):
+                    self._cache_version = (db_version, self._writes)
+            except Exception as e:
+                # Se reintenta en el próximo volcado
+                self._pending[:0] = pending
+                self._start_flush_timer()
+                print(f"Error guardando VMs: {e}")
+    
+    def _add_to_cache(self, vms: List[VMDetails]) -> bool:
+        """Agrega VMs nuevas al inicio de la caché sin volver a ordenar
+        
+        Retorna False si alguna reemplaza una VM existente o no es la más
+        reciente; en ese caso la caché se recarga en la próxima lectura.
+        """
+        cache = self._cache
+        if cache is None:
+            return False
+        
+        newest = cache[0].created_at if cache else ""
+        for vm in vms:
+            if vm.vm_id in self._by_id or vm.created_at < newest:
+                return False
+            newest = vm.created_at
+        
+        for vm in vms:
+            cache.insert(0, vm)
+            self._by_id[vm.vm_id] = vm
+            self._by_provider.setdefault(vm.provider_type.lower(), []).insert(0, vm)
+            self._by_status.setdefault(vm.status, []).insert(0, vm)
+        return True
+    
+    def get_all_vms(self, limit: Optional[int] = None, offset: int = 0) -> List[VMDetails]:
+        """Obtiene las VMs almacenadas, opcionalmente paginadas"""
+        try:
+            with self._lock:
+                vms = self._load()
+                end = None if limit is None else offset + limit
+                return vms[offset:end]
         except Exception as e:
             print(f"Error leyendo VMs: {e}")
             return []
     
-    def get_vms_by_provider(self, provider_type: str) -> List[VMDetails]:
-        """Obtiene VMs filtradas por proveedor"""
-        all_vms = self.get_all_vms()
-        return [vm for vm in all_vms if vm.provider_type.lower() == provider_type.lower()]
+    def count_vms_by_provider(self) -> Dict[str, int]:
+        """Cuenta las VMs por proveedor sin construir los modelos"""
+        try:
+            return self._counts("provider")
+        except Exception as e:
+            print(f"Error contando VMs: {e}")
+            return {}
+    
+    def get_vms_by_provider(self, provider_type: str, status: Optional[VMStatus] = None) -> List[VMDetails]:
+        """Obtiene VMs filtradas por proveedor y, opcionalmente, por estado"""
+        try:
+            with self._lock:
+                self.flush()
+                if not self._cache_current():
+                    # Sin caché vigente se filtra en SQL y solo se construyen las VMs que coinciden
+                    # (provider_type se compara sin distinguir mayúsculas: COLLATE NOCASE)
+                    if status is None:
+                        return self._query_vms("WHERE provider_type = ?", (provider_type,))
+                    return self._query_vms(
+                        "WHERE provider_type = ? AND status = ?",
+                        (provider_type, VMStatus(status).value)
+                    )
+                
+                vms = self._by_provider.get(provider_type.lower(), [])
+                if status is None:
+                    return list(vms)
+                return [vm for vm in vms if vm.status == status]
+        
+        except Exception as e:
+            print(f"Error leyendo VMs: {e}")
+            return []
     
     def get_vms_by_status(self, status: VMStatus) -> List[VMDetails]:
         """Obtiene VMs filtradas por estado"""
-        all_vms = self.get_all_vms()
-        return [vm for vm in all_vms if vm.status == status]
+        try:
+            with self._lock:
+                self.flush()
+                if not self._cache_current():
+                    return self._query_vms("WHERE status = ?", (VMStatus(status).value,))
+                return list(self._by_status.get(VMStatus(status), []))
+        except Exception as e:
+            print(f"Error leyendo VMs: {e}")
+            return []
     
     def get_vm_by_id(self, vm_id: str) -> Optional[VMDetails]:
         """Obtiene una VM específica por ID"""
-        all_vms = self.get_all_vms()
-        for vm in all_vms:
-            if vm.vm_id == vm_id:
-                return vm
-        return None
+        with self._lock:
+            self.flush()
+            if not self._cache_current():
+                vms = self._query_vms("WHERE vm_id = ?", (vm_id,))
+                return vms[0] if vms else None
+            return self._by_id.get(vm_id)
     
     def get_vms_summary(self) -> Dict:
-        """Obtiene un resumen de todas las VMs"""
-        all_vms = self.get_all_vms()
-        
-        summary = {
-            "total_vms": len(all_vms),
-            "vms_by_provider": {},
-            "vms_by_status": {},
-            "recent_vms": all_vms[:10]  # Últimas 10 VMs
-        }
-        
-        # Conteo por proveedor
-        for vm in all_vms:
-            provider = vm.provider_type
-            status = vm.status
+        """Obtiene un resumen de todas las VMs a partir de los conteos mantenidos"""
+        # Un solo tramo bajo el lock: ningún volcado se intercala entre los conteos y recent_vms
+        with self._lock:
+            vms_by_provider = self._counts("provider")
             
-            summary["vms_by_provider"][provider] = summary["vms_by_provider"].get(provider, 0) + 1
-            summary["vms_by_status"][status] = summary["vms_by_status"].get(status, 0) + 1
-        
-        return summary
+            return {
+                "total_vms": sum(vms_by_provider.values()),
+                "vms_by_provider": vms_by_provider,
+                "vms_by_status": self._counts("status"),
+                "recent_vms": self.get_all_vms(limit=10)  # Últimas 10 VMs
+            }
     
     def update_vm_status(self, vm_id: str, new_status: VMStatus) -> bool:
         """Actualiza el estado de una VM"""
         try:
-            with open(self.storage_file, 'r') as f:
-                data = json.load(f)
-            
-            if vm_id in data.get("vms", {}):
-                data["vms"][vm_id]["status"] = new_status
+            with self._lock:
+                # La VM puede estar aún en el buffer de escritura
+                self.flush()
+                new_status = VMStatus(new_status)
+                
+                with self._conn:
+                    db_version, cache_current = self._begin_write()
+                    cursor = self._conn.execute(
+                        "UPDATE vms SET status = ? WHERE vm_id = ?",
+                        (new_status.value, vm_id)
+                    )
                 
-                with open(self.storage_file, 'w') as f:
-                    json.dump(data, f, indent=2)
+                # Un vm_id inexistente no cambia nada: la caché y las respuestas siguen válidas
+                if cursor.rowcount == 0:
+                    return False
+                
+                self._writes += 1
+                if cache_current and self._patch_cache_status(vm_id, new_status):
+                    self._cache_version = (db_version, self._writes)
                 return True
-            
-            return False
-            
+        
         except Exception as e:
             print(f"Error actualizando VM: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _patch_cache_status(self, vm_id: str, new_status: VMStatus) -> bool:
+        """Cambia el estado de una VM en la caché sin recargar la base"""
+        old = self._by_id.get(vm_id)
+        if old is None or self._cache is None:
+            return False
+        
+        new = old.model_copy(update={"status": new_status})
+        self._by_id[vm_id] = new
+        _replace_item(self._cache, old, new)
+        _replace_item(self._by_provider[old.provider_type.lower()], old, new)
+        
+        # El índice del nuevo estado se reconstruye para conservar el orden por fecha
+        self._by_status[old.status] = [vm for vm in self._by_status[old.status] if vm is not old]
+        self._by_status[new_status] = [vm for vm in self._cache if vm.status == new_status]
+        return True
+    
+    def compact(self):
+        """Vuelca el WAL a la base y lo trunca para no arrastrar el log completo"""
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            print(f"Error compactando almacenamiento: {e}")
+    
+    def close(self):
+        """Vuelca las VMs pendientes, compacta el WAL y cierra la conexión"""
+        with self._lock:
+            self.flush()
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self.compact()
+            self._conn.close()
+
+def _replace_item(items: List[VMDetails], old: VMDetails, new: VMDetails):
+    """Reemplaza un elemento de la lista comparando por identidad"""
+    for index, item in enumerate(items):
+        if item is old:
+            items[index] = new
+            return
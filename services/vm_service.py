@@ -1,21 +1,69 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from factories.provider_factory import VMProviderFactory
 from models.providers import VMProvider
 from models.schemas import VMRequest, VMResponse, ProviderType, ProviderInfo, VMDetails, VMStatus, VMListResponse, ProviderVMsResponse
 from services.vm_repository import VMRepository
 from datetime import datetime
+from time import time
+import logging
+import os
+import re
+
+# Claves de parámetros que no deben persistirse en claro
+_SENSITIVE_RE = re.compile(r'password|credential|token|key|secret|api_key', re.IGNORECASE)
+
+# Parámetro que cada proveedor usa para el tipo de instancia y la región;
+# los proveedores sin entrada (on-premise o registrados después) usan
+# "instance_type" y "region"
+_INSTANCE_KEY = {
+    ProviderType.AWS: "instance_type",
+    ProviderType.AZURE: "vm_size",
+    ProviderType.GCP: "machine_type",
+}
+_REGION_KEY = {
+    ProviderType.AWS: "region",
+    ProviderType.AZURE: "location",
+    ProviderType.GCP: "zone",
+}
 
 class VMProvisioningService:
     """Servicio principal para el aprovisionamiento de VMs"""
     
-    def __init__(self):
+    # Máximo de respuestas de listado cacheadas por versión de los datos
+    RESPONSE_CACHE_SIZE = 128
+    
+    def __init__(self) -> None:
         self.provider_factory = VMProviderFactory()
-        self.vm_repository = VMRepository()
-        self.logger = None
+        self.vm_repository = self._create_repository()
+        self.logger: Optional[logging.Logger] = None
+        
+        # Respuestas de listado ya serializadas, válidas mientras no cambien los datos
+        self._responses: Dict[tuple, bytes] = {}
+        self._responses_version: Any = None
+        
+        # Último timestamp formateado, con precisión de segundos
+        self._timestamp_cache: Tuple[int, str] = (-1, "")
+    
+    def _create_repository(self):
+        """Selecciona el backend de almacenamiento según la configuración"""
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            # Estado compartido entre workers/pods; redis solo se importa si se usa
+            from services.redis_vm_repository import RedisVMRepository
+            return RedisVMRepository(redis_url)
+        return VMRepository()
+    
+    def close(self) -> None:
+        """Libera los recursos del repositorio al apagar la aplicación"""
+        self.vm_repository.close()
     
-    def set_logger(self, logger):
+    def set_logger(self, logger: logging.Logger) -> None:
         self.logger = logger
     
+    def set_http_client(self, http_client: Any) -> None:
+        """Comparte el cliente HTTP de la aplicación con los proveedores"""
+        self.provider_factory.set_http_client(http_client)
+    
     def provision_vm(self, vm_request: VMRequest) -> VMResponse:
         """Procesa una solicitud de aprovisionamiento de VM"""
         
@@ -28,16 +76,13 @@ class VMProvisioningService:
             
             # Si fue exitosa, guardar en el repositorio
             if response.status == "success":
+                provider_type = vm_request.provider_type
                 vm_details = VMDetails(
                     vm_id=response.vm_id,
-                    provider_type=vm_request.provider_type.value,
+                    provider_type=provider_type.value,
                     status=VMStatus.RUNNING,
-                    instance_type=vm_request.parameters.get("instance_type") or 
-                                 vm_request.parameters.get("vm_size") or 
-                                 vm_request.parameters.get("machine_type"),
-                    region=vm_request.parameters.get("region") or 
-                           vm_request.parameters.get("location") or 
-                           vm_request.parameters.get("zone"),
+                    instance_type=vm_request.parameters.get(_INSTANCE_KEY.get(provider_type, "instance_type")),
+                    region=vm_request.parameters.get(_REGION_KEY.get(provider_type, "region")),
                     created_at=response.timestamp,
                     parameters=self._sanitize_parameters(vm_request.parameters)
                 )
@@ -66,36 +111,62 @@ class VMProvisioningService:
     
     def _sanitize_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Elimina información sensible de los parámetros antes de guardar"""
-        sensitive_keys = ['password', 'credential', 'token', 'key', 'secret', 'api_key']
-        sanitized = parameters.copy()
-        
-        for key in sanitized.keys():
-            if any(sensitive in key.lower() for sensitive in sensitive_keys):
-                sanitized[key] = "***HIDDEN***"
-        
-        return sanitized
+        sensitive = [key for key in parameters if _SENSITIVE_RE.search(key)]
+        if not sensitive:
+            # Caso habitual: el diccionario se guarda tal cual, sin copiarlo
+            return parameters
+        return {**parameters, **dict.fromkeys(sensitive, "***HIDDEN***")}
+    
+    def _response_cache(self) -> Dict[tuple, bytes]:
+        """Caché de respuestas ya serializadas, descartada cuando cambia la versión de los datos"""
+        version = self.vm_repository.data_version()
+        if version != self._responses_version or len(self._responses) >= self.RESPONSE_CACHE_SIZE:
+            self._responses = {}
+            self._responses_version = version
+        return self._responses
     
-    def get_all_vms(self) -> VMListResponse:
-        """Obtiene todas las VMs creadas"""
-        all_vms = self.vm_repository.get_all_vms()
-        summary = self.vm_repository.get_vms_summary()
+    def get_all_vms(self, limit: int = 100, offset: int = 0) -> VMListResponse:
+        """Obtiene una página de las VMs creadas junto con los totales"""
+        vms = self.vm_repository.get_all_vms(limit=limit, offset=offset)
+        vms_by_provider = self.vm_repository.count_vms_by_provider()
         
-        return VMListResponse(
-            total_vms=summary["total_vms"],
-            vms_by_provider=summary["vms_by_provider"],
-            vms=all_vms
+        # Los VMDetails ya vienen validados del repositorio
+        return VMListResponse.model_construct(
+            total_vms=sum(vms_by_provider.values()),
+            vms_by_provider=vms_by_provider,
+            vms=vms
         )
     
-    def get_vms_by_provider(self, provider_type: str) -> ProviderVMsResponse:
-        """Obtiene VMs filtradas por proveedor"""
-        vms = self.vm_repository.get_vms_by_provider(provider_type)
+    def get_all_vms_json(self, limit: int = 100, offset: int = 0) -> bytes:
+        """Igual que get_all_vms, serializado a JSON y cacheado mientras no cambien los datos"""
+        cache = self._response_cache()
+        key = ("all", limit, offset)
+        content = cache.get(key)
+        if content is None:
+            response = self.get_all_vms(limit=limit, offset=offset)
+            content = cache[key] = VMListResponse.__pydantic_serializer__.to_json(response)
+        return content
+    
+    def get_vms_by_provider(self, provider_type: str, status: Optional[VMStatus] = None) -> ProviderVMsResponse:
+        """Obtiene VMs filtradas por proveedor y, opcionalmente, por estado"""
+        vms = self.vm_repository.get_vms_by_provider(provider_type, status=status)
         
-        return ProviderVMsResponse(
+        return ProviderVMsResponse.model_construct(
             provider_type=provider_type,
             total_vms=len(vms),
             vms=vms
         )
     
+    def get_vms_by_provider_json(self, provider_type: str, status: Optional[VMStatus] = None) -> bytes:
+        """Igual que get_vms_by_provider, serializado a JSON y cacheado mientras no cambien los datos"""
+        cache = self._response_cache()
+        key = ("provider", provider_type, status)
+        content = cache.get(key)
+        if content is None:
+            response = self.get_vms_by_provider(provider_type, status=status)
+            content = cache[key] = ProviderVMsResponse.__pydantic_serializer__.to_json(response)
+        return content
+    
     def get_vms_by_status(self, status: VMStatus) -> List[VMDetails]:
         """Obtiene VMs filtradas por estado"""
         return self.vm_repository.get_vms_by_status(status)
@@ -119,5 +190,11 @@ class VMProvisioningService:
         """Obtiene la lista de proveedores disponibles"""
         return self.provider_factory.get_available_providers()
     
-    def _get_timestamp(self):
-        return datetime.now().isoformat()
\ No newline at end of file
+    def _get_timestamp(self) -> str:
+        """Timestamp ISO con precisión de segundos; se formatea una vez por segundo"""
+        now = int(time())
+        cached = self._timestamp_cache
+        if cached[0] != now:
+            cached = (now, datetime.fromtimestamp(now).isoformat())
+            self._timestamp_cache = cached
+        return cached[1]
\ No newline at end of file